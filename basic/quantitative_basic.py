@@ -5,17 +5,228 @@
 # I am publishing this under an MIT license
 
 # standard imports
-from typing import Tuple, Any
+from typing import Tuple, Any, Callable
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
 
 # third party imports
 import pandas as pd
 import yfinance as yf
 import numpy as np
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
+from matplotlib.figure import Figure
+
+try:
+    from numba import njit
+except ImportError:  # the betas kernel falls back to NumPy
+    njit = None
 
 # local application imports
 
+# Copy-on-Write makes the DataFrame slices and column selections lazy views, only copied if they are modified
+pd.set_option("mode.copy_on_write", True)
+
+# Yahoo Finance chart endpoint, used to retrieve the price history without going through yf.download
+YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+
+# local Parquet cache of the downloaded data, and how long (in seconds) a cached download stays valid
+CACHE_DIR = ".cache"
+CACHE_TTL = 24 * 60 * 60
+
+# intervals where Yahoo returns one bar per trading day or longer, stamped at the market open
+DAILY_INTERVALS = ("1d", "5d", "1wk", "1mo", "3mo")
+
+
+def _fetch_chart(symbol: str, params: dict) -> tuple[str, dict]:
+    """
+    Blocking request of the Yahoo Finance chart JSON for a single symbol
+
+    Args:
+        :param symbol: stock ticker or index symbol
+        :type symbol: "str"
+
+        :param params: query string parameters of the chart request
+        :type params: "dict"
+
+    Returns:
+        tuple: the symbol and its decoded chart JSON
+
+    Raises:
+        KeyError: If Yahoo doesn't have the symbol, ie/ the request fails with an HTTP error
+    """
+    url = YAHOO_CHART_URL.format(symbol=urllib.parse.quote(symbol)) + "?" + urllib.parse.urlencode(params)
+    request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return symbol, json.load(response)
+
+    except urllib.error.HTTPError as e:
+        raise KeyError(f"Data for the {symbol} wasn't loaded") from e
+
+
+def _save_figure(fig: Figure, path: str):
+    """
+    Saves the matplotlib figure as a .png file, intended to run in a background thread
+
+    Args:
+        :param fig: the chart to be saved
+        :type fig: "Figure"
+
+        :param path: file path of the output .png
+        :type path: "str"
+    """
+    try:
+        fig.savefig(path)
+
+    except Exception as e:
+        print(f'Error: {e}')
+
+
+def _expanding_betas_numpy(close: np.ndarray, start: int, ends: np.ndarray, betas: np.ndarray):
+    """
+    NumPy version of the expanding window betas kernel, used when numba isn't installed.
+    Every window is a prefix of the same return series, so the sums over each window are
+    gathered from running (prefix) sums of the returns
+
+    Args:
+        :param close: 'Adj Close' values, one column per ticker and the index as the last column
+        :type close: "np.ndarray"
+
+        :param start: row position of the start date for this segment of beta calculations
+        :type start: "int"
+
+        :param ends: row positions of the last day of each window, at least start + 2
+        :type ends: "np.ndarray"
+
+        :param betas: (len(ends), tickers) output array, filled with the beta values
+        :type betas: "np.ndarray"
+    """
+    returns = close[start + 1:] / close[start:-1] - 1
+    x = returns[:, -1].astype(np.float64)
+    y = returns[:, :-1]
+
+    # prefix sums of x (index returns), x^2, y (stock returns) and xy, accumulated in float64
+    csx = np.cumsum(x)
+    csx2 = np.cumsum(x * x)
+    csy = np.cumsum(y, axis=0, dtype=np.float64)
+    csxy = np.cumsum(y * x[:, None], axis=0)
+
+    last = ends - start - 1
+    n = (ends - start)[:, None]
+    sx = csx[last, None]
+
+    # Σxy - Σx.Σy/n = (n - 1).cov(x, y) and Σx² - (Σx)²/n = n.var(x), the beta convention of _make_kernel
+    betas[:] = ((csxy[last] - sx * csy[last] / n) / (n - 1)) / ((csx2[last, None] - sx * sx / n) / n)
+
+
+def _rolling_betas(close: np.ndarray, ends: np.ndarray, window: int, betas: np.ndarray):
+    """
+    Betas of every ticker column against the index (last) column of close, over the rolling windows of the
+    last window daily returns up to each of the ends. The windows are strided views of one return series,
+    reduced with batched matrix products rather than a Python loop over the windows
+
+    Args:
+        :param close: 'Adj Close' values, one column per ticker and the index as the last column
+        :type close: "np.ndarray"
+
+        :param ends: row positions of the last day of each window, at least window
+        :type ends: "np.ndarray"
+
+        :param window: number of daily returns in each window, at least 2
+        :type window: "int"
+
+        :param betas: (len(ends), tickers) output array, filled with the beta values
+        :type betas: "np.ndarray"
+    """
+    # accumulate in float64, the windowed sums are formed from the raw (uncentred) returns
+    returns = (close[1:ends.max() + 1] / close[:ends.max()] - 1).astype(np.float64)
+
+    # the window of returns up to row e starts at return e - window, only the needed windows are gathered
+    x = sliding_window_view(returns[:, -1], window)[ends - window]             # (ends, window)
+    y = sliding_window_view(returns[:, :-1], window, axis=0)[ends - window]    # (ends, tickers, window)
+
+    sx = x.sum(axis=-1)[:, None]
+    sxx = (x[:, None, :] @ x[:, :, None])[:, 0]
+    sy = y.sum(axis=-1)
+    sxy = (y @ x[:, :, None])[..., 0]
+
+    # beta = (n.Σxy - Σx.Σy) / (n.Σx² - (Σx)²), scaled by n / (n - 1) for the beta convention of _make_kernel
+    betas[:] = (window * sxy - sx * sy) / (window * sxx - sx * sx) * window / (window - 1)
+
+
+@functools.lru_cache(maxsize=None)
+def _make_kernel(n_tickers: int) -> Callable:
+    """
+    Compiles the expanding window betas kernel for a fixed number of tickers. The ticker count is a
+    compile time constant of the generated code, so LLVM can fully unroll and vectorize the per-ticker
+    updates. The kernels are compiled once per ticker count, or fall back to NumPy without numba
+
+    All the betas calculations keep the convention of the original np.cov(stock, index)[0, 1] / np.var(index),
+    ie/ the sample covariance (ddof=1) over the population variance (ddof=0) - the OLS beta scaled by n / (n - 1)
+
+    Args:
+        :param n_tickers: number of ticker columns of close, the index being the column after them
+        :type n_tickers: "int"
+
+    Returns:
+        Callable: kernel(close, start, ends, betas) that fills betas with the beta values
+    """
+    if njit is None:
+        return _expanding_betas_numpy
+
+    def expanding_betas(close, start, ends, betas):
+        """
+        Compiled kernel for the betas of every ticker column against the index column of close,
+        over the expanding windows of rows start to ends[e]. The windows share their days, so the
+        means and co-moments are updated with Welford's online algorithm in a single pass over the days,
+        emitting the betas as each end is reached
+        """
+        # running mean and sum of squared deviations of x (index returns),
+        # running means of y (stock returns) and the co-moments of x and y.
+        # The returns are float32 like close, the accumulators are float64
+        mean_x = 0.0
+        m2_x = 0.0
+        mean_y = np.zeros(n_tickers)
+        c_xy = np.zeros(n_tickers)
+
+        i = start
+        for e in np.argsort(ends):
+            # extend the window with only the days since the previous end
+            while i < ends[e]:
+                n = i - start + 1
+
+                x = close[i + 1, n_tickers] / close[i, n_tickers] - 1
+                dx = x - mean_x
+                mean_x += dx / n
+                m2_x += dx * (x - mean_x)
+
+                for k in range(n_tickers):
+                    y = close[i + 1, k] / close[i, k] - 1
+                    mean_y[k] += (y - mean_y[k]) / n
+                    c_xy[k] += dx * (y - mean_y[k])
+
+                i += 1
+
+            # beta = (c_xy / (n - 1)) / (m2_x / n), the np.cov / np.var convention above
+            n = ends[e] - start
+            for k in range(n_tickers):
+                betas[e, k] = c_xy[k] / m2_x * n / (n - 1)
+
+    # compile eagerly for the float32 close and betas arrays. The numpy error model divides by zero to inf / NaN
+    # like the NumPy calculations, ie/ for a zero price or a flat index, rather than raising ZeroDivisionError
+    return njit("void(f4[:, :], i8, i8[:], f4[:, :])", fastmath={'reassoc', 'contract'},
+                error_model='numpy')(expanding_betas)
+
 
 class QuantitativeCalcs:
     """
@@ -28,24 +239,43 @@ class QuantitativeCalcs:
     self.tickers : list
         stock ticker symbols to be used in the calculations
         example: tickers = ["SCGLY", "BNPQY", "RNLSY", "LRLCY", "SBGSY", "VEOEY"]
+    self._close : np.ndarray
+        column-major float32 array of the 'Adj Close' values,
+        one column per ticker and the index as the last column
+    self._dates_i8 : np.ndarray
+        sorted dates of the rows in self._close, as int64 nanoseconds for binary searching
+    self._index : str
+        comparative index loaded as the last column of self._close
     """
 
     def __init__(self, tickers):
         self.yf_data = tuple()
         self.tickers = tickers
+        self._close = np.empty((0, 0))
+        self._dates_i8 = np.empty(0, dtype=np.int64)
+        self._index = None
 
-    def load_data(self, index: str, **kwargs: Any):
+    def load_data(self, index: str, use_yfinance: bool = False, use_cache: bool = True, **kwargs: Any):
         """
         Important to only dl and load the data as needed to maximize efficiency
 
-        Retrieves historical data for the tickers and ^GSPC in a single call
+        Retrieves historical data for the tickers and ^GSPC in a single concurrent batch of
+        Yahoo Finance chart requests, or in a single yf.download call if use_yfinance is set
         yf.download relies on a string of tickers separated by space ie/ 'SCGLY PFE'
+        Downloads are kept for CACHE_TTL seconds in a local Parquet cache, keyed on the symbols, source and kwargs
 
         Args:
             :param index: comparative index to be used for beta calculations
             :type index: "str"
 
+            :param use_yfinance: download through yf.download rather than the chart endpoint
+            :type use_yfinance: "bool"
+
+            :param use_cache: load from, and save to, the local Parquet cache in CACHE_DIR
+            :type use_cache: "bool"
+
             :param kwargs: Optional arguments to be passed to the yf.download function.
+                The chart endpoint only uses start, end, interval and prepost
 
             :Keyword Arguments:
                 start (str): The start date in YYYY-MM-DD format.
@@ -68,18 +298,51 @@ class QuantitativeCalcs:
             >>> self.load_data("^GSPC", start='2020-01-01', end='2020-12-31', interval='1d')
         """
         try:
-            stock_str = " ".join(self.tickers)
+            symbols = self.tickers + [index]
+
+            cache_path = self._cache_path(symbols, use_yfinance, **kwargs)
+            data = self._read_cache(cache_path) if use_cache else None
+            cached = data is not None
 
-            data: Tuple[pd.DataFrame] = yf.download(stock_str + " " + index, **kwargs, group_by='ticker')
+            if not cached and use_yfinance:
+                stock_str = " ".join(self.tickers)
+                data: Tuple[pd.DataFrame] = yf.download(stock_str + " " + index, **kwargs, group_by='ticker')
+            elif not cached:
+                data = self._download_charts(symbols, **kwargs)
 
             # Check if the data isn't empty
             if data.empty:
-                raise ValueError("yf.download didn't complete correctly for the ticker list")
+                raise ValueError("the download didn't complete correctly for the ticker list")
 
             # Check if index data is available
             if index not in data:
                 raise KeyError(f"Data for the {index} wasn't loaded")
 
+            # Check if the data of every ticker is available - once here, rather than in every beta calculation
+            for ticker in self.tickers:
+                if ticker not in data:
+                    raise KeyError(f"data for {ticker} wasn't loaded")
+
+            # yf.download reports a symbol that failed to download as all NaN columns
+            for symbol in symbols:
+                if data[symbol]['Adj Close'].isna().all():
+                    raise KeyError(f"Data for the {symbol} wasn't loaded - no 'Adj Close' values")
+
+            # Only cache downloads that passed the checks above
+            if use_cache and not cached:
+                self._save_cache(data, cache_path)
+
+            # Only the 'Adj Close' values are used in the calculations, so copy them once into a column-major
+            # array - every ticker column is then contiguous and the calculations never touch the MultiIndex.
+            # The betas are only reported to two decimals, so float32 is ample and halves the memory traffic
+            close = np.empty((len(data), len(symbols)), dtype=np.float32, order='F')
+            for k, symbol in enumerate(symbols):
+                close[:, k] = data[symbol]['Adj Close'].to_numpy(copy=False)
+
+            self._close = close
+            self._dates_i8 = data.index.values.astype('datetime64[ns]').view('i8')
+            self._index = index
+
             self.yf_data = data
 
         except (KeyError, ValueError) as e:
@@ -90,16 +353,212 @@ class QuantitativeCalcs:
             print("Unknown error:", e)
             return None
 
+    @staticmethod
+    def _cache_path(symbols: list[str], use_yfinance: bool, **kwargs: Any) -> str:
+        """
+        Path of the Parquet cache file of a download, keyed on the symbols, the data source and the download arguments
+
+        Args:
+            :param symbols: stock tickers and the index to be downloaded
+            :type symbols: "list"
+
+            :param use_yfinance: whether the download goes through yf.download rather than the chart endpoint
+            :type use_yfinance: "bool"
+
+            :param kwargs: the load_data download arguments, ie/ start, end and interval
+
+        Returns:
+            str: the cache file path within CACHE_DIR
+        """
+        # dates may be given as strings or timestamps, so normalize them to get the same key either way
+        for date_arg in ('start', 'end'):
+            if kwargs.get(date_arg) is not None:
+                kwargs[date_arg] = pd.Timestamp(kwargs[date_arg]).isoformat()
+
+        key = hashlib.blake2b(repr((sorted(symbols), use_yfinance, sorted(kwargs.items()))).encode()).hexdigest()[:16]
+
+        return os.path.join(CACHE_DIR, f"yf_{key}.parquet")
+
+    @staticmethod
+    def _read_cache(cache_path: str) -> pd.DataFrame | None:
+        """
+        Reads a download from the Parquet cache, if it is within CACHE_TTL. A missing, expired or unreadable
+        cache file is a cache miss, so the data is downloaded again
+
+        Args:
+            :param cache_path: the cache file path from _cache_path
+            :type cache_path: "str"
+
+        Returns:
+            pd.DataFrame: the cached ticker data, or None on a cache miss
+        """
+        try:
+            if time.time() - os.path.getmtime(cache_path) >= CACHE_TTL:
+                return None
+
+            return pd.read_parquet(cache_path)
+
+        except FileNotFoundError:
+            return None
+
+        except (ImportError, OSError, ValueError) as e:
+            print("Error: the cached download wasn't read -", e)
+            return None
+
+    @staticmethod
+    def _save_cache(data: pd.DataFrame, cache_path: str):
+        """
+        Saves the downloaded data to the Parquet cache, a failed save only means the next call downloads again.
+        The file is written under a temporary name and then renamed, so an interrupted write never leaves
+        a truncated cache file behind
+
+        Args:
+            :param data: the downloaded ticker data
+            :type data: "pd.DataFrame"
+
+            :param cache_path: the cache file path from _cache_path
+            :type cache_path: "str"
+        """
+        temp_path = f"{cache_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            data.to_parquet(temp_path)
+            os.replace(temp_path, cache_path)
+
+        except (ImportError, OSError, ValueError) as e:
+            print("Error: the download wasn't cached -", e)
+
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def _download_charts(symbols: list[str], start: Any = None, end: Any = None, interval: str = '1d',
+                         prepost: bool = False, **kwargs: Any) -> pd.DataFrame:
+        """
+        Retrieves the historical data for all the symbols from the Yahoo Finance chart endpoint,
+        with the requests issued concurrently and the JSON parsed straight into one DataFrame
+        in the yf.download(group_by='ticker') layout
+
+        Args:
+            :param symbols: stock tickers and the index to be downloaded
+            :type symbols: "list"
+
+            :param start: The start date in YYYY-MM-DD format, or a timestamp
+            :param end: The end date (exclusive) in YYYY-MM-DD format, or a timestamp
+            :param interval: Valid intervals: [1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo]
+            :param prepost: include pre-market and after-hours trading data
+
+            :param kwargs: the remaining yf.download options, which don't apply to the chart endpoint
+
+        Returns:
+            pd.DataFrame: Open, High, Low, Close, Adj Close and Volume columns grouped by symbol
+
+        Raises:
+            KeyError: If no data was returned for one of the symbols
+        """
+        params = {
+            "period1": int(pd.Timestamp(start).timestamp()) if start is not None else 0,
+            "period2": int(pd.Timestamp(end).timestamp()) if end is not None else int(time.time()),
+            "interval": interval,
+            "includePrePost": str(prepost).lower(),
+            "events": "div,splits",
+        }
+
+        # every (symbol, field) column as a Series on its own dates, the DataFrame constructor aligns them
+        # once on the union of the dates - no per-symbol frames or pd.concat block consolidation
+        columns = {}
+        # issue the chart requests for all the symbols concurrently, rather than one after another -
+        # threads rather than an event loop, so this also works for callers already running one
+        with ThreadPoolExecutor(max_workers=len(symbols)) as executor:
+            charts = list(executor.map(_fetch_chart, symbols, [params] * len(symbols)))
+
+        for symbol, chart in charts:
+            result = chart['chart']['result']
+            if not result or 'timestamp' not in result[0]:
+                raise KeyError(f"Data for the {symbol} wasn't loaded")
+
+            result = result[0]
+            quote = result['indicators']['quote'][0]
+
+            # intraday intervals have no adjusted close
+            adj_close = result['indicators'].get('adjclose', [{'adjclose': quote['close']}])[0]['adjclose']
+
+            # bars are stamped in UTC seconds, convert them to the exchange's local time like yf.download
+            dates = pd.to_datetime(result['timestamp'], unit='s', utc=True) \
+                .tz_convert(result['meta']['exchangeTimezoneName']).tz_localize(None)
+            if interval in DAILY_INTERVALS:
+                dates = dates.normalize()
+
+            fields = {'Open': quote['open'], 'High': quote['high'], 'Low': quote['low'],
+                      'Close': quote['close'], 'Adj Close': adj_close, 'Volume': quote['volume']}
+            for field, values in fields.items():
+                columns[(symbol, field)] = pd.Series(values, index=dates, dtype=np.float64)
+
+        data = pd.DataFrame(columns)
+        data.index.name = 'Date'
+
+        return data
+
 
 class QuantitativeBeta(QuantitativeCalcs):
     """ Commence with the basic quantitative analysis questions """
     def __init__(self, tickers):
         super().__init__(tickers)
         self.betas = []
+        self._kernel = None
+
+    def load_data(self, index: str, use_yfinance: bool = False, use_cache: bool = True, **kwargs: Any):
+        """
+        Loads the data as QuantitativeCalcs.load_data, then compiles (or fetches the already compiled)
+        expanding window betas kernel for the number of ticker columns loaded into self._close
+
+        Args:
+            :param index: comparative index to be used for beta calculations
+            :type index: "str"
+
+            :param use_yfinance: download through yf.download rather than the chart endpoint
+            :type use_yfinance: "bool"
+
+            :param use_cache: load from, and save to, the local Parquet cache in CACHE_DIR
+            :type use_cache: "bool"
+
+            :param kwargs: Optional arguments to be passed to the yf.download function
+
+        Returns:
+            None: This just loads the df data into self.yf_data
+        """
+        super().load_data(index, use_yfinance, use_cache, **kwargs)
+
+        if self._index is not None:
+            self._kernel = _make_kernel(self._close.shape[1] - 1)
+
+    def _check_loaded(self, index: str):
+        """
+        Verify the loaded close prices match the index and the current tickers, the kernels
+        work on the columns of self._close by position
+
+        Args:
+            :param index: comparative index to be used for beta calculations
+            :type index: "str"
 
-    def prepare_beta_calculations(self, index: str, date_range: pd.DatetimeIndex, start: str):
+        Raises:
+            KeyError: If the index, or the current tickers, weren't the ones loaded by load_data
+        """
+        # the kernels use the index loaded as the last column of self._close
+        if index != self._index:
+            raise KeyError(f"Data for the {index} wasn't loaded")
+
+        # the tickers may have been changed since load_data
+        if self._close.shape[1] - 1 != len(self.tickers):
+            raise KeyError(f"data for the tickers {self.tickers} wasn't loaded - call load_data again")
+
+    def prepare_beta_calculations(self, index: str, date_range: pd.DatetimeIndex, start: str,
+                                  window: int | None = None):
         """
         complete all the beta calculation preparations
+        The betas are calculated over expanding windows from the start date to each end date,
+        or over rolling windows of the last window daily returns up to each end date
 
         Args:
             :param index: comparative index to be used for beta calculations
@@ -111,33 +570,55 @@ class QuantitativeBeta(QuantitativeCalcs):
             :param date_range: Pandas df of the entirety of the date time index to be iterated over
             :type date_range: "pd.DatetimeIndex"
 
+            :param window: number of daily returns in each rolling window, None for expanding windows
+            :type window: "int"
+
         Returns:
-            dict: The beta values for the tickers, in two decimal places
+            None: This loads the beta values of the tickers for every end date, in two decimal places,
+                into the self.betas DataFrame
 
         Raises:
             ValueError: If ticker isn't found, or if there is error with the data retrieval
             KeyError: If the ticker wasn't loaded within the yf.download
         """
         try:
-            df_betas = []
-
             # Verify that the date range isn't empty
             if date_range.empty:
                 raise ValueError("no date range - empty DateTimeIndex")
 
-            for end_date in date_range:
-                betas = self._calculate_beta(index=index, start=start, end=end_date)
+            self._check_loaded(index)
 
-                df = pd.DataFrame(betas, index=[end_date])
-                df_betas.append(df)
+            if window is not None and window < 2:
+                raise ValueError(f"Cannot calculate beta over a window of {window} - needs at least 2 returns")
 
-                print(f'\ncurrent date is {end_date}')
-                for ticker, beta_val in betas.items():
-                    print(f'Ticker: {ticker} - with a beta of {beta_val}')
+            # Only the row positions of the start and of each end_date are needed -
+            # the returns and moments are accumulated in the kernels
+            lo = np.searchsorted(self._dates_i8, pd.Timestamp(start).value, side='left')
+            ends = np.searchsorted(self._dates_i8, date_range.values.astype('datetime64[ns]').view('i8'),
+                                   side='right') - 1
+
+            # Verify sufficient return data to perform the beta calculations, with any rolling window after start
+            insufficient = ends - lo < 2 if window is None else ends - lo < window
+            if insufficient.any():
+                raise ValueError(f"Cannot calculate beta for {date_range[insufficient][0]} - lacking sufficient data")
+
+            # Column-major float32 buffer, so every ticker's betas are contiguous for plotting and any
+            # per-ticker statistics - the DataFrame is built on the buffer without copying it
+            betas = np.empty((len(date_range), len(self.tickers)), dtype=np.float32, order='F')
+            if window is None:
+                self._kernel(self._close, lo, ends, betas)
+            else:
+                _rolling_betas(self._close, ends, window, betas)
+            np.round(betas, 2, out=betas)
 
-            self.betas = pd.concat(df_betas)
+            self.betas = pd.DataFrame(betas, index=date_range, columns=self.tickers, copy=False)
 
-        except ValueError as e:
+            for end_date, row in zip(date_range, betas):
+                print(f'\ncurrent date is {end_date}')
+                for ticker, beta_val in zip(self.tickers, row):
+                    print(f'Ticker: {ticker} - with a beta of {round(float(beta_val), 2)}')
+
+        except (KeyError, ValueError) as e:
             print(f"Error: {e}")
 
         except Exception as e:
@@ -147,7 +628,7 @@ class QuantitativeBeta(QuantitativeCalcs):
     def _calculate_beta(self, index: str, start: str, end: str) -> dict[str, float] | None:
         """
         beta: measure of a stock's volatility in relation to the overall market (typical metric SP500)
-        Calculate the beta for a given stock symbol
+        Calculate the beta of the tickers over a single date range, with the same kernel as prepare_beta_calculations
 
         Args:
             :param index: comparative index to be used for beta calculations
@@ -168,58 +649,33 @@ class QuantitativeBeta(QuantitativeCalcs):
         """
 
         try:
-            betas_dict = {}
-
-            # Use boolean mask with the pd.DataFrame.loc method to slice DataFrame by date range.
-            # It's faster than .loc accessor as you avoid creating a df copy, rather done on original df
-
-            mask = (self.yf_data.index >= start) & (self.yf_data.index <= end)
-            df_yf_data = self.yf_data.loc[mask]
-
-            # perform error checking
-            if df_yf_data.empty:
-                raise ValueError("yf.download didn't complete correctly for the ticker list")
-
-            if index not in df_yf_data:
-                raise KeyError(f"Data for the {index} wasn't loaded")
-
-            # Calculate index returns using vectorized operations
-            # ex EOD index[day + 1] value / EOD index [day] value - 1  gives  daily % return
-            sp500_returns = df_yf_data[index]['Adj Close'] \
-                .values[1:] / df_yf_data[index]['Adj Close'].values[:-1] - 1
-
-            for ticker in self.tickers:
-                if ticker not in df_yf_data:
-                    raise KeyError(f"data for {ticker} wasn't loaded")
-
-                # Calculate daily returns using vectorized operations
-                stock_returns = df_yf_data[ticker]['Adj Close'] \
-                    .values[1:] / df_yf_data[ticker]['Adj Close'].values[:-1] - 1
+            self._check_loaded(index)
 
-                # Verify sufficient return data to perform the beta calculations
-                if len(stock_returns) < 2 or len(sp500_returns) < 2:
-                    raise ValueError(f"Cannot calculate beta for {ticker} - lacking sufficient data")
+            # The loaded dates are sorted, so binary search for the row positions of the date range
+            lo = np.searchsorted(self._dates_i8, pd.Timestamp(start).value, side='left')
+            hi = np.searchsorted(self._dates_i8, pd.Timestamp(end).value, side='right')
 
-                # Calculate the stock's beta
-                # beta = covariance (stock's return relative to market) / variance (of the market's return)
-                beta = np.cov(stock_returns, sp500_returns)[0, 1] / np.var(sp500_returns)
+            # Verify sufficient return data to perform the beta calculations
+            if hi - 1 - lo < 2:
+                raise ValueError(f"Cannot calculate beta for {self.tickers} - lacking sufficient data")
 
-                betas_dict[ticker] = round(beta, 2)
+            # a single expanding window, ending on the last day within the date range
+            betas = np.empty((1, len(self.tickers)), dtype=np.float32)
+            self._kernel(self._close, lo, np.array([hi - 1], dtype=np.int64), betas)
 
-            return betas_dict
+            return {ticker: round(float(beta), 2) for ticker, beta in zip(self.tickers, betas[0])}
 
         except (KeyError, ValueError) as e:
             print("Error:", e)
             return None
 
-        except Exception as e:
-            print("Unknown error:", e)
-            return None
-
-    def plot_betas(self):
+    def plot_betas(self) -> threading.Thread | None:
         """
         Utilizing the current beta values, creates an output chart of betas using matplotlib
         and will plot the values from the self.tickers
+
+        Returns:
+            threading.Thread: the background thread saving the .png file, join() it to wait for the file
         """
 
         try:
@@ -228,20 +684,28 @@ class QuantitativeBeta(QuantitativeCalcs):
                 print("Error: calculate_beta.betas isn't a DataFrame")
                 return None
 
-            plt.plot(self.betas.index, self.betas)
+            # A standalone figure, never registered with pyplot's global figure manager - it needs no GUI backend,
+            # renders with Agg when saved, and is simply garbage collected once the background save is done
+            fig = Figure()
+            ax = fig.subplots()
+            ax.plot(self.betas.index, self.betas.to_numpy(copy=False))
 
-            plt.title('Stock Beta over time')
-            plt.xlabel('Date')
-            plt.ylabel('Beta')
+            ax.set_title('Stock Beta over time')
+            ax.set_xlabel('Date')
+            ax.set_ylabel('Beta')
 
-            plt.legend(self.tickers, loc='lower left')
+            ax.legend(self.tickers, loc='lower left')
 
             # Create a datetime stamp in the format "YYYY-MM-DD_HH-MM-SS" and save .png of beta results
             now = datetime.now()
             datetime_stamp = now.strftime("%Y-%m-%d_%H-%M-%S")
             save_str = 'output/beta_' + datetime_stamp + '.png'
 
-            plt.savefig(save_str)
+            # write the file in the background, so the caller isn't blocked on the disk I/O
+            save_thread = threading.Thread(target=_save_figure, args=(fig, save_str))
+            save_thread.start()
+
+            return save_thread
 
         except Exception as e:
             print(f'Error: {e}')
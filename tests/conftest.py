@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# pytest fixtures shared by the test modules
+
+import sys
+import os
+
+# third party imports
+import pytest
+import pandas as pd
+
+# Add the application root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# local application and library specifics imports
+from basic import quantitative_basic
+from basic.quantitative_basic import QuantitativeBeta
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cache_dir(tmp_path_factory: pytest.TempPathFactory):
+    """
+    Keeps the Parquet download cache of the test session in a temporary directory, rather than the working directory
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        path = tmp_path_factory.mktemp("cache")
+        monkeypatch.setattr(quantitative_basic, "CACHE_DIR", str(path))
+        yield path
+
+
+@pytest.fixture(scope="session", params=[False, True], ids=["chart", "yfinance"])
+def yf_panel(request: pytest.FixtureRequest) -> pd.DataFrame:
+    """
+    Downloads the data of all the test tickers in a single batch, once per data source - the Yahoo chart endpoint
+    and yf.download - shared by every test in the session rather than each test downloading its own ticker
+    """
+    # unadjusted prices from yf.download as well, which also keeps its 'Adj Close' column
+    source_kwargs = {'use_yfinance': True, 'auto_adjust': False} if request.param else {}
+
+    calculations = QuantitativeBeta(["HSBC", "BP"])
+    calculations.load_data("^GSPC", start='2020-01-01', end='2020-02-01', interval='1d', **source_kwargs)
+
+    # load_data only prints its errors, so a failed download leaves yf_data as the initial empty tuple
+    if not isinstance(calculations.yf_data, pd.DataFrame):
+        source = "yf.download" if request.param else "chart endpoint"
+        pytest.skip(f"downloading the test tickers through the {source} failed - is the network available?")
+
+    return calculations.yf_data
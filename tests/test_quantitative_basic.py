@@ -1,17 +1,18 @@
 #!/usr/bin/env python3
 # pytest test_quantitative_basic.py
 
-import sys
+import asyncio
+import io
 import os
+import urllib.error
 
 # third party imports
 import pytest
+import numpy as np
 import pandas as pd
 
-# Add the application root directory to the Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-# local application and library specifics imports
+# local application and library specifics imports, the application root is added to the path in conftest.py
+from basic import quantitative_basic
 from basic.quantitative_basic import QuantitativeBeta
 
 
@@ -20,50 +21,411 @@ from basic.quantitative_basic import QuantitativeBeta
 @pytest.mark.parametrize("yfinance_params", [
     {
         "ticker": ["HSBC"],
-        "start_date": '2020-01-01',
-        "periods": 1,
-        "frequency": 'M',
-        "interval": '1d',
-        "index": "^GSPC",
         "results": 39.14
     },
     {
         "ticker": ["BP"],
-        "start_date": '2020-01-01',
-        "periods": 1,
-        "frequency": 'M',
-        "interval": '1d',
-        "index": "^GSPC",
         "results": 38.04
     },
 ])
-def test_load_data(yfinance_params: dict):
+def test_load_data(yf_panel: pd.DataFrame, yfinance_params: dict):
     """
-    Ensure that yfinance loads basic values properly
+    Ensure that both the chart endpoint and yf.download load basic values properly
+    :param yf_panel: session wide download of the test tickers from each data source, from 2020-01-01 against ^GSPC
+    :type yf_panel: 'pd.DataFrame'
+
     :param yfinance_params: All parameters required to be input to run the test
     :type yfinance_params: 'list'
 
     :yfinance_params:
         ticker (list['str']): list of the ticker symbol
-        start_date (str): The start date in YYYY-MM-DD format.
-        periods (int): number of time periods to be utilized
-        frequency (str): Time span of future calculations
-        intervals (str): Valid intervals: [1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo]
-        index (str): comparative index to be used for beta calculations
         results (float): value of the stock ticker on the first period day noted
     """
-    # set initial program parameters
-    calculations = QuantitativeBeta(yfinance_params['ticker'])
+    assert round(yf_panel[yfinance_params['ticker'][0]]['Open']
+                 .to_numpy(copy=False)[0], 2) == yfinance_params['results']
+
+
+@pytest.fixture
+def synthetic_yf_data() -> pd.DataFrame:
+    """
+    Offline stand-in for the yf.download(group_by='ticker') result of two tickers and the ^GSPC index
+    """
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2020-01-01', '2021-06-30')
+
+    market = rng.normal(0.0005, 0.01, len(dates))
+    frames = {}
+    for symbol, beta in (("HSBC", 0.8), ("BP", 1.3), ("^GSPC", 1.0)):
+        returns = beta * market + rng.normal(0, 0.005, len(dates)) if symbol != "^GSPC" else market
+        close = 100 * np.cumprod(1 + returns)
+        frames[symbol] = pd.DataFrame({'Open': close, 'High': close, 'Low': close,
+                                       'Close': close, 'Adj Close': close, 'Volume': 1000}, index=dates)
+
+    return pd.concat(frames, axis=1)
+
+
+@pytest.fixture
+def loaded_calculations(synthetic_yf_data: pd.DataFrame, monkeypatch: pytest.MonkeyPatch) -> QuantitativeBeta:
+    """
+    QuantitativeBeta of HSBC and BP with the synthetic_yf_data loaded against ^GSPC from 2020-01-01
+    """
+    monkeypatch.setattr("basic.quantitative_basic.yf.download", lambda *args, **kwargs: synthetic_yf_data)
+
+    calculations = QuantitativeBeta(["HSBC", "BP"])
+    calculations.load_data(index="^GSPC", use_yfinance=True, use_cache=False, start='2020-01-01', interval='1d')
+
+    return calculations
+
+
+@pytest.mark.quant_beta
+def test_prepare_beta_calculations(loaded_calculations: QuantitativeBeta, synthetic_yf_data: pd.DataFrame):
+    """
+    Ensure the expanding window betas match a direct covariance / variance calculation for every end date
+    :param loaded_calculations: HSBC and BP loaded with the synthetic_yf_data
+    :type loaded_calculations: 'QuantitativeBeta'
+    :param synthetic_yf_data: offline price data for HSBC, BP and ^GSPC
+    :type synthetic_yf_data: 'pd.DataFrame'
+    """
+    tickers = ["HSBC", "BP"]
+    start_date = '2020-01-01'
+    date_range = pd.date_range('2020-03-31', periods=12, freq='M')
+
+    loaded_calculations.prepare_beta_calculations(index="^GSPC", date_range=date_range, start=start_date)
+
+    for end_date in date_range:
+        window = synthetic_yf_data.loc[start_date:end_date]
+        index_close = window["^GSPC"]['Adj Close'].to_numpy(copy=False)
+        index_returns = index_close[1:] / index_close[:-1] - 1
+
+        for ticker in tickers:
+            close = window[ticker]['Adj Close'].to_numpy(copy=False)
+            returns = close[1:] / close[:-1] - 1
+            expected = np.cov(returns, index_returns)[0, 1] / np.var(index_returns)
+
+            assert loaded_calculations.betas.loc[end_date, ticker] == pytest.approx(expected, abs=0.005 + 1e-9)
+
+
+@pytest.mark.quant_beta
+def test_prepare_beta_calculations_zero_price(loaded_calculations: QuantitativeBeta, synthetic_yf_data: pd.DataFrame,
+                                              capsys: pytest.CaptureFixture):
+    """
+    Ensure a zero price (a bad tick on 2020-06-01) gives non-finite betas from the June window on, like NumPy,
+    rather than an error
+    :param loaded_calculations: HSBC and BP loaded with the synthetic_yf_data
+    :type loaded_calculations: 'QuantitativeBeta'
+    :param synthetic_yf_data: offline price data for HSBC, BP and ^GSPC
+    :type synthetic_yf_data: 'pd.DataFrame'
+    """
+    date_range = pd.date_range('2020-03-31', periods=6, freq='M')
+
+    synthetic_yf_data.loc['2020-06-01', ("HSBC", 'Adj Close')] = 0.0
+    loaded_calculations.load_data(index="^GSPC", use_yfinance=True, use_cache=False, start='2020-01-01', interval='1d')
+
+    loaded_calculations.prepare_beta_calculations(index="^GSPC", date_range=date_range, start='2020-01-01')
+
+    assert "error" not in capsys.readouterr().out.lower()
+
+    hsbc = loaded_calculations.betas["HSBC"].to_numpy(copy=False)
+    assert np.isfinite(hsbc[:3]).all() and not np.isfinite(hsbc[3:]).any()
+    assert np.isfinite(loaded_calculations.betas["BP"].to_numpy(copy=False)).all()
+
+
+@pytest.mark.quant_beta
+def test_prepare_rolling_beta_calculations(loaded_calculations: QuantitativeBeta, synthetic_yf_data: pd.DataFrame):
+    """
+    Ensure the rolling window betas match a direct covariance / variance calculation over the last window returns
+    :param loaded_calculations: HSBC and BP loaded with the synthetic_yf_data
+    :type loaded_calculations: 'QuantitativeBeta'
+    :param synthetic_yf_data: offline price data for HSBC, BP and ^GSPC
+    :type synthetic_yf_data: 'pd.DataFrame'
+    """
+    tickers = ["HSBC", "BP"]
+    start_date = '2020-01-01'
+    window = 60
+    date_range = pd.date_range('2020-04-30', periods=12, freq='M')
+
+    loaded_calculations.prepare_beta_calculations(index="^GSPC", date_range=date_range, start=start_date,
+                                                  window=window)
+
+    for end_date in date_range:
+        window_data = synthetic_yf_data.loc[:end_date].iloc[-(window + 1):]
+        index_close = window_data["^GSPC"]['Adj Close'].to_numpy(copy=False)
+        index_returns = index_close[1:] / index_close[:-1] - 1
+
+        for ticker in tickers:
+            close = window_data[ticker]['Adj Close'].to_numpy(copy=False)
+            returns = close[1:] / close[:-1] - 1
+            expected = np.cov(returns, index_returns)[0, 1] / np.var(index_returns)
+
+            assert loaded_calculations.betas.loc[end_date, ticker] == pytest.approx(expected, abs=0.005 + 1e-6)
+
+
+@pytest.mark.quant_beta
+def test_prepare_beta_calculations_unloaded_index(loaded_calculations: QuantitativeBeta, capsys: pytest.CaptureFixture):
+    """
+    Ensure the betas aren't calculated against an index other than the one loaded
+    :param loaded_calculations: HSBC and BP loaded with the synthetic_yf_data
+    :type loaded_calculations: 'QuantitativeBeta'
+    """
+    loaded_calculations.prepare_beta_calculations(index="^DJI", start='2020-01-01',
+                                                  date_range=pd.date_range('2020-03-31', periods=3, freq='M'))
+
+    assert "Data for the ^DJI wasn't loaded" in capsys.readouterr().out
+    assert not isinstance(loaded_calculations.betas, pd.DataFrame)
+
+
+@pytest.mark.quant_beta
+def test_expanding_betas_numpy_fallback(loaded_calculations: QuantitativeBeta, monkeypatch: pytest.MonkeyPatch):
+    """
+    Ensure the NumPy kernel used without numba matches the compiled kernel
+    :param loaded_calculations: HSBC and BP loaded with the synthetic_yf_data
+    :type loaded_calculations: 'QuantitativeBeta'
+    """
+    close = loaded_calculations._close
+    ends = np.arange(10, len(close), 7, dtype=np.int64)
+
+    # bypass the lru_cache, the compiled kernel of two tickers is already cached
+    with monkeypatch.context() as without_numba:
+        without_numba.setattr(quantitative_basic, "njit", None)
+        fallback = quantitative_basic._make_kernel.__wrapped__(2)
+
+    assert fallback is quantitative_basic._expanding_betas_numpy
+
+    expected = np.empty((len(ends), 2), dtype=np.float32)
+    quantitative_basic._make_kernel(2)(close, 3, ends, expected)
+    betas = np.empty((len(ends), 2), dtype=np.float32)
+    fallback(close, 3, ends, betas)
+
+    np.testing.assert_allclose(betas, expected, rtol=1e-4)
+
+
+@pytest.mark.quant_beta
+def test_prepare_beta_calculations_changed_tickers(loaded_calculations: QuantitativeBeta,
+                                                   capsys: pytest.CaptureFixture):
+    """
+    Ensure the betas aren't calculated for tickers added after load_data, which have no close prices loaded
+    :param loaded_calculations: HSBC and BP loaded with the synthetic_yf_data
+    :type loaded_calculations: 'QuantitativeBeta'
+    """
+    loaded_calculations.tickers.append("AZN")
+
+    loaded_calculations.prepare_beta_calculations(index="^GSPC", start='2020-01-01',
+                                                  date_range=pd.date_range('2020-03-31', periods=3, freq='M'))
+
+    assert "data for the tickers ['HSBC', 'BP', 'AZN'] wasn't loaded" in capsys.readouterr().out
+    assert not isinstance(loaded_calculations.betas, pd.DataFrame)
+    assert loaded_calculations._calculate_beta(index="^GSPC", start='2020-01-01', end='2020-03-31') is None
+
+
+@pytest.mark.quant_beta
+def test_calculate_beta(loaded_calculations: QuantitativeBeta):
+    """
+    Ensure the single date range betas match the expanding window betas of prepare_beta_calculations
+    :param loaded_calculations: HSBC and BP loaded with the synthetic_yf_data
+    :type loaded_calculations: 'QuantitativeBeta'
+    """
+    tickers = ["HSBC", "BP"]
+    start_date = '2020-01-01'
+    date_range = pd.date_range('2020-03-31', periods=12, freq='M')
+
+    loaded_calculations.prepare_beta_calculations(index="^GSPC", date_range=date_range, start=start_date)
+
+    for end_date in date_range:
+        betas = loaded_calculations._calculate_beta(index="^GSPC", start=start_date, end=end_date)
+
+        assert betas == {ticker: round(float(loaded_calculations.betas.loc[end_date, ticker]), 2)
+                         for ticker in tickers}
+
+
+@pytest.mark.quant_beta
+def test_calculate_beta_zero_price(loaded_calculations: QuantitativeBeta, synthetic_yf_data: pd.DataFrame):
+    """
+    Ensure a zero price (a bad tick) within the date range gives a NaN beta rather than raising
+    :param loaded_calculations: HSBC and BP loaded with the synthetic_yf_data
+    :type loaded_calculations: 'QuantitativeBeta'
+    :param synthetic_yf_data: offline price data for HSBC, BP and ^GSPC
+    :type synthetic_yf_data: 'pd.DataFrame'
+    """
+    synthetic_yf_data.loc['2020-06-01', ("HSBC", 'Adj Close')] = 0.0
+    loaded_calculations.load_data(index="^GSPC", use_yfinance=True, use_cache=False, start='2020-01-01', interval='1d')
+
+    betas = loaded_calculations._calculate_beta(index="^GSPC", start='2020-01-01', end='2020-06-30')
+
+    assert np.isnan(betas["HSBC"])
+    assert np.isfinite(betas["BP"])
+
+
+@pytest.mark.quant_beta
+def test_float32_betas_golden(loaded_calculations: QuantitativeBeta, synthetic_yf_data: pd.DataFrame):
+    """
+    Ensure the betas from the float32 close prices round to the same two decimals as a float64 calculation
+    :param loaded_calculations: HSBC and BP loaded with the synthetic_yf_data
+    :type loaded_calculations: 'QuantitativeBeta'
+    :param synthetic_yf_data: offline price data for HSBC, BP and ^GSPC
+    :type synthetic_yf_data: 'pd.DataFrame'
+    """
+    tickers = ["HSBC", "BP"]
+    start_date = '2020-01-01'
+    date_range = pd.bdate_range('2020-01-10', '2021-06-30')
+
+    loaded_calculations.prepare_beta_calculations(index="^GSPC", date_range=date_range, start=start_date)
+
+    close = synthetic_yf_data.loc[start_date:].xs('Adj Close', axis=1, level=1)
+    returns = (close / close.shift(1) - 1).iloc[1:]
+
+    for end_date in date_range:
+        window = returns.loc[:end_date]
+        index_returns = window["^GSPC"].to_numpy(copy=False)
+
+        for ticker in tickers:
+            expected = np.cov(window[ticker].to_numpy(copy=False), index_returns)[0, 1] / np.var(index_returns)
+
+            assert round(float(loaded_calculations.betas.loc[end_date, ticker]), 2) == round(expected, 2)
+
+
+def canned_chart(symbol: str, params: dict) -> tuple[str, dict]:
+    """
+    Offline stand-in for _fetch_chart, with the Yahoo chart JSON of three daily bars stamped at the New York open.
+    The ^GSPC chart has no adjclose, and the HSBC chart has a missing (None) close
+    """
+    # 2020-01-02, 2020-01-03 and 2020-01-06 at 09:30 New York time, 14:30 UTC
+    timestamps = [1577975400, 1578061800, 1578321000]
+    closes = {"HSBC": [39.0, None, 39.5], "BP": [38.0, 38.2, 38.4], "^GSPC": [3257.85, 3234.85, 3246.28]}[symbol]
+
+    indicators = {'quote': [{'open': closes, 'high': closes, 'low': closes, 'close': closes, 'volume': [100] * 3}]}
+    if symbol != "^GSPC":
+        indicators['adjclose'] = [{'adjclose': [close * 0.9 if close else None for close in closes]}]
+
+    return symbol, {'chart': {'result': [{'meta': {'exchangeTimezoneName': 'America/New_York'},
+                                          'timestamp': timestamps, 'indicators': indicators}], 'error': None}}
+
+
+@pytest.mark.quant_beta
+def test_download_charts(monkeypatch: pytest.MonkeyPatch):
+    """
+    Ensure the chart JSON is parsed into the yf.download(group_by='ticker') layout
+    """
+    monkeypatch.setattr(quantitative_basic, "_fetch_chart", canned_chart)
+
+    data = QuantitativeBeta._download_charts(["HSBC", "BP", "^GSPC"], start='2020-01-01', end='2020-01-07')
+
+    # bars are dated in the exchange's local time, normalized to midnight for daily intervals
+    assert list(data.index) == list(pd.to_datetime(['2020-01-02', '2020-01-03', '2020-01-06']))
+    assert list(data["HSBC"].columns) == ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+    # a missing price is NaN, and without an adjclose the close is used
+    assert np.isnan(data["HSBC"]['Close'].iloc[1]) and np.isnan(data["HSBC"]['Adj Close'].iloc[1])
+    assert data["BP"]['Adj Close'].iloc[0] == pytest.approx(38.0 * 0.9)
+    assert data["^GSPC"]['Adj Close'].equals(data["^GSPC"]['Close'])
+
+
+@pytest.mark.quant_beta
+def test_download_charts_unknown_symbol(monkeypatch: pytest.MonkeyPatch):
+    """
+    Ensure an HTTP error for an unknown symbol is reported as a KeyError naming the symbol
+    """
+    def not_found(request, timeout):
+        raise urllib.error.HTTPError(request.full_url, 404, "Not Found", {}, io.BytesIO(b"{}"))
+
+    monkeypatch.setattr(quantitative_basic.urllib.request, "urlopen", not_found)
+
+    with pytest.raises(KeyError, match="Data for the NOPE wasn't loaded"):
+        QuantitativeBeta._download_charts(["NOPE"], start='2020-01-01', end='2020-01-07')
+
+
+@pytest.mark.quant_beta
+def test_load_data_in_running_event_loop(monkeypatch: pytest.MonkeyPatch):
+    """
+    Ensure load_data works for callers already running an event loop, ie/ Jupyter or async applications
+    """
+    monkeypatch.setattr(quantitative_basic, "_fetch_chart", canned_chart)
+
+    calculations = QuantitativeBeta(["BP"])
+
+    async def load():
+        calculations.load_data(index="^GSPC", use_cache=False, start='2020-01-01', end='2020-01-07')
+
+    asyncio.run(load())
+
+    assert isinstance(calculations.yf_data, pd.DataFrame)
+
+
+@pytest.mark.quant_beta
+def test_load_data_cache(synthetic_yf_data: pd.DataFrame, monkeypatch: pytest.MonkeyPatch, tmp_path):
+    """
+    Ensure downloads are cached per symbols, source and arguments, and expire after CACHE_TTL
+    :param synthetic_yf_data: offline price data for HSBC, BP and ^GSPC
+    :type synthetic_yf_data: 'pd.DataFrame'
+    """
+    monkeypatch.setattr(quantitative_basic, "CACHE_DIR", str(tmp_path))
+
+    downloads = []
+    monkeypatch.setattr("basic.quantitative_basic.yf.download",
+                        lambda *args, **kwargs: downloads.append("yfinance") or synthetic_yf_data)
+    monkeypatch.setattr(QuantitativeBeta, "_download_charts",
+                        staticmethod(lambda *args, **kwargs: downloads.append("chart") or synthetic_yf_data))
+
+    def load(use_yfinance: bool, end) -> pd.DataFrame:
+        calculations = QuantitativeBeta(["HSBC", "BP"])
+        calculations.load_data(index="^GSPC", use_yfinance=use_yfinance, start='2020-01-01', end=end, interval='1d')
+        return calculations.yf_data
+
+    load(True, '2021-06-30')
+
+    # the same dates given as a Timestamp are served from the cache, and the Parquet round-trip keeps the data
+    cached = load(True, pd.Timestamp('2021-06-30'))
+    assert downloads == ["yfinance"]
+    pd.testing.assert_frame_equal(cached, synthetic_yf_data, check_freq=False)
+
+    # the chart endpoint download is cached separately
+    load(False, '2021-06-30')
+    assert downloads == ["yfinance", "chart"]
+
+    # other arguments are a different download
+    load(True, '2021-05-31')
+    assert downloads == ["yfinance", "chart", "yfinance"]
+
+    # an expired cache file is downloaded again
+    for cache_file in tmp_path.iterdir():
+        os.utime(cache_file, (0, 0))
+
+    load(True, '2021-06-30')
+    assert downloads == ["yfinance", "chart", "yfinance", "yfinance"]
+
+
+@pytest.mark.quant_beta
+def test_load_data_cache_failures(synthetic_yf_data: pd.DataFrame, monkeypatch: pytest.MonkeyPatch, tmp_path):
+    """
+    Ensure a failed symbol download isn't cached, and an unreadable cache file is downloaded again
+    :param synthetic_yf_data: offline price data for HSBC, BP and ^GSPC
+    :type synthetic_yf_data: 'pd.DataFrame'
+    """
+    monkeypatch.setattr(quantitative_basic, "CACHE_DIR", str(tmp_path))
+
+    # yf.download returns all NaN columns for a symbol it failed to download
+    failed_download = synthetic_yf_data.copy()
+    failed_download.loc[:, ("BP", slice(None))] = np.nan
+
+    downloads = []
+    monkeypatch.setattr("basic.quantitative_basic.yf.download",
+                        lambda *args, **kwargs: downloads.append("yfinance") or failed_download)
+
+    calculations = QuantitativeBeta(["HSBC", "BP"])
+    calculations.load_data(index="^GSPC", use_yfinance=True, start='2020-01-01', interval='1d')
+
+    assert not isinstance(calculations.yf_data, pd.DataFrame)
+    assert not list(tmp_path.iterdir())
 
-    date_range = pd.date_range(yfinance_params['start_date'],
-                               periods=yfinance_params['periods'],
-                               freq=yfinance_params['frequency'])
+    # an interrupted write of the cache file is a cache miss, and is replaced by the next download
+    monkeypatch.setattr("basic.quantitative_basic.yf.download",
+                        lambda *args, **kwargs: downloads.append("yfinance") or synthetic_yf_data)
+    cache_path = QuantitativeBeta._cache_path(["HSBC", "BP", "^GSPC"], True, start='2020-01-01', interval='1d')
+    with open(cache_path, "wb") as cache_file:
+        cache_file.write(b"PAR1 truncated")
 
-    # load core data values
-    calculations.load_data(index=yfinance_params['index'],
-                           start=yfinance_params['start_date'],
-                           end=date_range[-1],
-                           interval=yfinance_params['interval'])
+    calculations.load_data(index="^GSPC", use_yfinance=True, start='2020-01-01', interval='1d')
+    calculations.load_data(index="^GSPC", use_yfinance=True, start='2020-01-01', interval='1d')
 
-    assert round(calculations.yf_data[yfinance_params['ticker'][0]]['Open']
-                 .values[0], 2) == yfinance_params['results']
+    assert downloads == ["yfinance", "yfinance"]
+    assert isinstance(calculations.yf_data, pd.DataFrame)
+    assert [path.name for path in tmp_path.iterdir()] == [os.path.basename(cache_path)]